@@ -0,0 +1,73 @@
+"""Benchmark `_get_members` on synthetic modules with many members.
+
+Each module has N functions (all listed in ``__all__``) and N/2 data members.
+For every N, the time for one ``typ='function', in_list='__all__'`` query
+plus one ``typ='class'`` query is printed; the time per member should stay
+roughly constant if `_get_members` scales linearly.
+
+Usage::
+
+    python benchmarks/bench_get_members.py [--path CHECKOUT] [N ...]
+
+where CHECKOUT is a directory containing the ``better_apidoc.py`` to
+benchmark (default: the parent directory of this script), e.g. a
+``git worktree`` of an older revision, to compare timings for the same N.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import types
+
+
+def make_module(n):
+    mod = types.ModuleType('bigmod')
+    names = []
+    for i in range(n):
+        def f():
+            pass
+        f.__module__ = 'bigmod'
+        f.__name__ = f.__qualname__ = 'f%d' % i
+        setattr(mod, f.__name__, f)
+        names.append(f.__name__)
+        if i % 2 == 0:
+            setattr(mod, 'x%d' % i, i)
+    mod.__all__ = names
+    return mod
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--path', default=os.path.join(os.path.dirname(__file__), '..'),
+        help='directory containing better_apidoc.py')
+    parser.add_argument(
+        'n', nargs='*', type=int,
+        default=[1000, 10000, 20000, 50000, 100000],
+        help='numbers of functions in the synthetic module')
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.abspath(args.path))
+    import better_apidoc
+    from sphinx.application import Sphinx
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, 'conf.py'), 'w') as out_fh:
+            out_fh.write("extensions = ['sphinx.ext.autodoc']\n")
+        better_apidoc.APP = Sphinx(
+            tmpdir, tmpdir, os.path.join(tmpdir, '_build'),
+            os.path.join(tmpdir, '_build', 'doctrees'), 'html',
+            status=None, warning=None)
+        print('%8s %10s %14s' % ('N', 'time [s]', 'per member [us]'))
+        for n in args.n:
+            mod = make_module(n)
+            start = time.perf_counter()
+            better_apidoc._get_members(
+                mod, typ='function', in_list='__all__')
+            better_apidoc._get_members(mod, typ='class')
+            runtime = time.perf_counter() - start
+            print('%8d %10.3f %14.1f' % (n, runtime, 1e6 * runtime / n))
+
+
+if __name__ == '__main__':
+    main()
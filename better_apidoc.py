@@ -22,12 +22,26 @@ from __future__ import print_function
 import os
 import sys
 import re
+import io
+import ast
+import gzip
+import json
+import time
+import types
 import inspect
 import importlib
 import optparse
+import multiprocessing
+import tarfile
+import threading
+import tokenize
+import zipfile
 from os import path, walk
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from six import binary_type
+from six.moves import builtins
 from fnmatch import fnmatch
 from docutils import nodes
 from docutils.parsers.rst.states import RSTStateMachine, state_classes
@@ -54,7 +68,7 @@ __display_version__ = __version__
 
 try:
     # For type annotation
-    from typing import Any, List, Tuple  # NOQA
+    from typing import Any, Dict, List, Set, Tuple  # NOQA
 except ImportError:
     pass
 
@@ -72,6 +86,9 @@ else:
 
 INITPY = '__init__.py'
 PY_SUFFIXES = set(['.py', '.pyx'])
+# modules with these suffixes are introspected from their stub (or source)
+# instead of being imported
+STUB_SUFFIXES = set(['.pyx'])
 
 
 def _warn(msg):
@@ -92,6 +109,302 @@ def makename(package, module):
     return name
 
 
+def _write_text(fname, text):
+    # type: (unicode, unicode) -> None
+    with FileAvoidWrite(fname) as f:
+        f.write(text)
+
+
+class PageWriter(object):
+    """Pool of background threads writing generated pages to disk.
+
+    At most `max_pending` pages may be queued or in the process of being
+    written; :meth:`submit` blocks until a slot becomes available. An
+    exception raised while writing a page is re-raised by the next call to
+    :meth:`submit` or :meth:`close`.
+    """
+
+    def __init__(self, workers, max_pending=None):
+        # type: (int, int) -> None
+        if max_pending is None:
+            max_pending = 4 * workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._errors = []  # type: List[BaseException]
+
+    def _done(self, future):
+        self._slots.release()
+        error = future.exception()
+        if error is not None:
+            self._errors.append(error)
+
+    def _raise_errors(self):
+        if self._errors:
+            raise self._errors[0]
+
+    def exists(self, fname):
+        # type: (unicode) -> bool
+        """Check whether the file `fname` already exists."""
+        return path.isfile(fname)
+
+    def submit(self, fname, text):
+        # type: (unicode, unicode) -> None
+        """Schedule writing `text` to the file `fname`."""
+        self._raise_errors()
+        self._slots.acquire()
+        future = self._executor.submit(_write_text, fname, text)
+        future.add_done_callback(self._done)
+
+    def close(self):
+        # type: () -> None
+        """Wait for all pending pages to be written."""
+        self._executor.shutdown(wait=True)
+        self._raise_errors()
+
+
+# name of the archive member listing the pages in an archive
+ARCHIVE_INDEX = '.better-apidoc-index.json'
+ARCHIVE_INDEX_VERSION = 1
+
+# tarfile stream modes for supported archive file extensions (anything else
+# is written as a zip file)
+TAR_MODES = [
+    ('.tar', 'w|'), ('.tar.gz', 'w|gz'), ('.tgz', 'w|gz'),
+    ('.tar.bz2', 'w|bz2'), ('.tar.xz', 'w|xz')]
+
+
+class ArchiveWriter(object):
+    """Write all pages into the single archive `filename`, instead of into
+    individual files.
+
+    The type of archive is determined by the file extension of `filename`:
+    a (possibly compressed) tar file for the extensions in `TAR_MODES`, a
+    compressed zip file otherwise. Pages are added as one sequential stream,
+    with member names relative to `destdir`, and an index of all pages is
+    added as the member `ARCHIVE_INDEX` when the archive is closed. The
+    archive can be read with :class:`ArchiveReader`.
+    """
+
+    def __init__(self, filename, destdir=''):
+        # type: (unicode, unicode) -> None
+        self.filename = filename
+        self._destdir = destdir
+        self._pages = []  # type: List[unicode]
+        self._page_set = set()  # type: Set[unicode]
+        self._tar = None
+        self._zip = None
+        for ext, mode in TAR_MODES:
+            if filename.endswith(ext):
+                self._tar = tarfile.open(filename, mode)
+                break
+        else:
+            self._zip = zipfile.ZipFile(
+                filename, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def _add(self, name, data):
+        # type: (unicode, bytes) -> None
+        if self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = time.time()
+            self._tar.addfile(info, io.BytesIO(data))
+        else:
+            self._zip.writestr(name, data)
+
+    def exists(self, fname):
+        # type: (unicode) -> bool
+        """Check whether the page `fname` was already added."""
+        return path.relpath(fname, self._destdir or '.') in self._page_set
+
+    def submit(self, fname, text):
+        # type: (unicode, unicode) -> None
+        """Add `text` to the archive as the page `fname`."""
+        name = path.relpath(fname, self._destdir or '.')
+        self._add(name, text.encode('utf-8'))
+        self._pages.append(name)
+        self._page_set.add(name)
+
+    def close(self):
+        # type: () -> None
+        """Add the index and finish writing the archive."""
+        index = {'version': ARCHIVE_INDEX_VERSION, 'pages': self._pages}
+        self._add(ARCHIVE_INDEX, json.dumps(index, indent=1).encode('utf-8'))
+        if self._tar is not None:
+            self._tar.close()
+        else:
+            self._zip.close()
+
+
+class ArchiveReader(object):
+    """Read the pages from an archive written by :class:`ArchiveWriter`.
+
+    Pages in a zip archive are read on demand; a tar archive is read in a
+    single pass when it is opened.
+    """
+
+    def __init__(self, filename):
+        # type: (unicode) -> None
+        self.filename = filename
+        self._zip = None
+        self._data = {}  # type: Dict[unicode, bytes]
+        if zipfile.is_zipfile(filename):
+            self._zip = zipfile.ZipFile(filename)
+            index = self._zip.read(ARCHIVE_INDEX)
+        else:
+            with tarfile.open(filename, 'r|*') as tar:
+                for info in tar:
+                    if info.isfile():
+                        self._data[info.name] = tar.extractfile(info).read()
+            index = self._data.pop(ARCHIVE_INDEX)
+        index = json.loads(index.decode('utf-8'))
+        if index.get('version') != ARCHIVE_INDEX_VERSION:
+            raise ValueError(
+                "%s: unsupported index version %r"
+                % (filename, index.get('version')))
+        self.pages = index['pages']  # type: List[unicode]
+
+    def read(self, name):
+        # type: (unicode) -> unicode
+        """Return the text of the page `name`."""
+        if self._zip is not None:
+            data = self._zip.read(name)
+        else:
+            data = self._data[name]
+        return data.decode('utf-8')
+
+    def extract(self, destdir):
+        # type: (unicode) -> None
+        """Write all pages to `destdir`. Files whose content does not change
+        are not touched.
+
+        Raise ValueError, before writing any file, if the name of a page is
+        an absolute path or contains a '..' component.
+        """
+        for name in self.pages:
+            parts = re.split(r'[\\/]', name)
+            if path.isabs(name) or path.splitdrive(name)[0] or '..' in parts:
+                raise ValueError(
+                    "%s: unsafe page name %r" % (self.filename, name))
+        for name in self.pages:
+            fname = path.join(destdir, name)
+            if not path.isdir(path.dirname(fname)):
+                os.makedirs(path.dirname(fname))
+            _write_text(fname, self.read(name))
+
+    def close(self):
+        # type: () -> None
+        if self._zip is not None:
+            self._zip.close()
+        self._data = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def extract_archive(filename, destdir):
+    # type: (unicode, unicode) -> List[unicode]
+    """Write the pages in the archive `filename` (written with
+    ``--archive``) to `destdir`, and return their names."""
+    with ArchiveReader(filename) as reader:
+        reader.extract(destdir)
+        return reader.pages
+
+
+INVENTORY_VERSION = 1
+
+
+class InventoryWriter(object):
+    """Record all pages in the inventory file `filename`, instead of writing
+    them as individual files.
+
+    For pages generated from a template, the inventory contains the name of
+    the template and the template variables, and the introspection results
+    for the modules (see `_get_module_record`), so that the pages can be
+    rendered with :func:`render_inventory` without importing any modules.
+    All other pages are recorded as text. The inventory is written as JSON,
+    compressed with gzip if `filename` ends with ``.gz``.
+    """
+
+    def __init__(self, filename, destdir='', suffix='rst'):
+        # type: (unicode, unicode, unicode) -> None
+        self.filename = filename
+        self._destdir = destdir
+        self._suffix = suffix
+        self._pages = []  # type: List[Dict]
+        self._templates = {}  # type: Dict[unicode, Dict]
+        self._modules = {}  # type: Dict[unicode, Dict]
+        self._claimed = set()  # type: Set[unicode]
+
+    def claim_module(self, fullname):
+        # type: (unicode) -> bool
+        """Return whether the module `fullname` still has to be introspected,
+        and consider it introspected from now on."""
+        if fullname in self._claimed:
+            return False
+        self._claimed.add(fullname)
+        return True
+
+    def add_module(self, fullname, record):
+        # type: (unicode, Dict) -> None
+        """Add the introspection `record` for the module `fullname`."""
+        self._modules[fullname] = record
+
+    def add_template(self, page, template, **args):
+        # type: (unicode, unicode, Any) -> None
+        """Record that `page` is rendered from `template`, with the
+        arguments `args` for `_render_template`."""
+        self._templates[page] = dict(template=template, **args)
+
+    def exists(self, fname):
+        # type: (unicode) -> bool
+        return False
+
+    def submit(self, fname, text):
+        # type: (unicode, unicode) -> None
+        """Record the page `fname` with `text` (the text used if the page
+        cannot be rendered from a template)."""
+        name = path.relpath(fname, self._destdir or '.')
+        name = name[:-len(self._suffix) - 1]
+        page = {'page': name, 'text': text}
+        page.update(self._templates.pop(name, {}))
+        self._pages.append(page)
+
+    def close(self):
+        # type: () -> None
+        """Write the inventory file."""
+        inventory = {
+            'version': INVENTORY_VERSION,
+            'generator': 'better-apidoc %s' % __version__,
+            'pages': self._pages, 'modules': self._modules}
+        data = json.dumps(inventory, separators=(',', ':')).encode('utf-8')
+        if self.filename.endswith('.gz'):
+            with gzip.open(self.filename, 'wb') as out_fh:
+                out_fh.write(data)
+        else:
+            with open(self.filename, 'wb') as out_fh:
+                out_fh.write(data)
+
+
+def read_inventory(filename):
+    # type: (unicode) -> Dict
+    """Read an inventory file written with ``--write-inventory``."""
+    if filename.endswith('.gz'):
+        with gzip.open(filename, 'rb') as in_fh:
+            data = in_fh.read()
+    else:
+        with open(filename, 'rb') as in_fh:
+            data = in_fh.read()
+    inventory = json.loads(data.decode('utf-8'))
+    if inventory.get('version') != INVENTORY_VERSION:
+        raise ValueError(
+            "%s: unsupported inventory version %r"
+            % (filename, inventory.get('version')))
+    return inventory
+
+
 def write_file(name, text, opts):
     # type: (unicode, unicode, Any) -> None
     """Write the output file for module/package <name>."""
@@ -99,12 +412,19 @@ def write_file(name, text, opts):
     if opts.dryrun:
         print('Would create file %s.' % fname)
         return
-    if not opts.force and path.isfile(fname):
+    writer = getattr(opts, 'writer', None)
+    if writer is not None:
+        exists = writer.exists(fname)
+    else:
+        exists = path.isfile(fname)
+    if not opts.force and exists:
         print('File %s already exists, skipping.' % fname)
     else:
         print('Creating file %s.' % fname)
-        with FileAvoidWrite(fname) as f:
-            f.write(text)
+        if writer is not None:
+            writer.submit(fname, text)
+        else:
+            _write_text(fname, text)
 
 
 def format_heading(level, text):
@@ -117,15 +437,17 @@ def format_heading(level, text):
 def format_directive(module, package=None):
     # type: (unicode, unicode) -> unicode
     """Create the automodule directive and add the options."""
-    directive = '.. automodule:: %s\n' % makename(package, module)
-    for option in OPTIONS:
-        directive += '    :%s:\n' % option
-    return directive
+    return ''.join(
+        ['.. automodule:: %s\n' % makename(package, module)] +
+        ['    :%s:\n' % option for option in OPTIONS])
 
 
-def create_module_file(package, module, opts):
-    # type: (unicode, unicode, Any) -> None
-    """Generate RST for a top-level module (i.e., not part of a package)"""
+def create_module_file(package, module, opts, source=None):
+    # type: (unicode, unicode, Any, unicode) -> None
+    """Generate RST for a top-level module (i.e., not part of a package)
+
+    `source` is the path of the module file, if known.
+    """
     if not opts.noheadings:
         text = format_heading(1, '%s module' % module)
     else:
@@ -133,19 +455,13 @@ def create_module_file(package, module, opts):
     # text += format_heading(2, ':mod:`%s` Module' % module)
     text += format_directive(module, package)
 
-    if opts.templates:
-        template_loader = FileSystemLoader(opts.templates)
-        template_env = SandboxedEnvironment(loader=template_loader)
-        try:
-            mod_ns = _get_mod_ns(
-                name=module, fullname=module,
-                includeprivate=opts.includeprivate)
-            template = template_env.get_template('module.rst')
-            text = template.render(**mod_ns)
-        except ImportError as e:
-            _warn('failed to import %r: %s' % (module, e))
-        add_get_members_to_template_env(template_env, module, opts)
-    write_file(makename(package, module), text, opts)
+    if _uses_templates(opts):
+        template_env = _get_template_env(opts.templates)
+        _render_page(
+            template_env, 'module.rst', module, makename(package, module),
+            opts, text, source=source)
+    else:
+        write_file(makename(package, module), text, opts)
 
 
 def _get_documenter(app, member, mod):
@@ -158,6 +474,133 @@ def _get_documenter(app, member, mod):
             return get_documenter(member, mod)
 
 
+def _has_custom_documenters(app):
+    """Check whether `app` registers autodoc documenters other than the ones
+    that ship with Sphinx"""
+    registry = getattr(app, 'registry', None)
+    documenters = getattr(registry, 'documenters', {})
+    return any(
+        not documenter.__module__.startswith('sphinx.ext.autodoc')
+        for documenter in documenters.values())
+
+
+def _get_member_type(member, mod, use_documenter=True):
+    """Return tuple `(objtype, directivetype)` of the documenter for
+    mod.member
+
+    If `use_documenter` is False, functions and classes are classified
+    directly, without asking Sphinx for their documenter.
+    """
+    if not use_documenter:
+        if inspect.isfunction(member) or inspect.isbuiltin(member):
+            return 'function', 'function'
+        if inspect.isclass(member):
+            if issubclass(member, BaseException):
+                return 'exception', 'exception'
+            return 'class', 'class'
+    documenter = _get_documenter(APP, member, mod)
+    return (getattr(documenter, 'objtype', None),
+            getattr(documenter, 'directivetype', None))
+
+
+class _ModuleMember(object):
+    """The member `name` (with value `obj`) of the module `mod`, with the
+    properties used by `_get_members` evaluated on demand"""
+
+    def __init__(self, mod, name, obj):
+        self.mod = mod
+        self.name = name
+        self.obj = obj
+
+    @property
+    def is_local(self):
+        """Whether the member is defined locally in the module"""
+        if hasattr(self.obj, '__module__'):
+            return getattr(self.obj, '__module__') == self.mod.__name__
+        else:
+            # we take missing __module__ to mean the member is a data object
+            # it is recommended to filter data by e.g. __all__
+            return True
+
+    @property
+    def fullname(self):
+        return _get_fullname(self.name, obj=self.obj)
+
+    @property
+    def summary(self):
+        return extract_summary(self.obj)
+
+    def get_type(self, use_documenter=True):
+        """Return tuple `(objtype, directivetype)`, see `_get_member_type`"""
+        return _get_member_type(self.obj, self.mod, use_documenter)
+
+
+def _iter_members(mod, names):
+    """Yield a `_ModuleMember` for each of the `names` in `mod` that is not a
+    module (or a special attribute)"""
+    for name in names:
+        if name.startswith('__'):
+            continue
+        try:
+            member = safe_getattr(mod, name)
+        except AttributeError:
+            continue
+        if inspect.ismodule(member):
+            continue
+        yield _ModuleMember(mod, name, member)
+
+
+class _InventoryMember(object):
+    """A module member as recorded in an inventory file, with the same
+    interface as `_ModuleMember`"""
+
+    def __init__(self, name, objtype, directivetype, is_local, fullname,
+                 summary):
+        self.name = name
+        self.objtype = objtype
+        self.directivetype = directivetype
+        self.is_local = is_local
+        self.fullname = fullname
+        self.summary = summary
+
+    def get_type(self, use_documenter=True):
+        return self.objtype, self.directivetype
+
+
+class ModuleInventory(object):
+    """Stand-in for the module `fullname` in `_get_members` and
+    `_get_mod_ns`, based on the `record` for the module in an inventory
+    file (see `_get_module_record`).
+
+    Module attributes that are lists of names or mappings of names to
+    references (e.g. ``__all__``, for the `in_list` and `known_refs`
+    arguments of `_get_members`) are available as attributes.
+    """
+
+    def __init__(self, fullname, record):
+        self.__name__ = fullname
+        self.__doc__ = record['doc']
+        self._members = OrderedDict(
+            (member[0], _InventoryMember(*member))
+            for member in record['members'])
+        self._attributes = record['attributes']
+
+    def __dir__(self):
+        return list(self._members)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['_attributes'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def iter_members(self, names):
+        """Yield an `_InventoryMember` for each of the `names`"""
+        for name in names:
+            if name in self._members:
+                yield self._members[name]
+
+
 def _get_members(
         mod, typ=None, include_imported=False, out_format='names',
         in_list=None, known_refs=None):
@@ -177,26 +620,15 @@ def _get_members(
     if out_format not in out_formats:
         raise ValueError("out_format %s not in %r" % (out_format, out_formats))
 
-    def check_typ(typ, mod, member):
-        """Check if mod.member is of the desired typ"""
-        if inspect.ismodule(member):
-            return False
-        documenter = _get_documenter(APP, member, mod)
+    def check_typ(typ, objtype, directivetype):
+        """Check if a member with the given documenter types is of the
+        desired typ"""
         if typ is None:
             return True
-        if typ == getattr(documenter, 'objtype', None):
-            return True
-        if hasattr(documenter, 'directivetype'):
-            return roles[typ] == getattr(documenter, 'directivetype')
-
-    def is_local(mod, member, name):
-        """Check whether mod.member is defined locally in module mod"""
-        if hasattr(member, '__module__'):
-            return getattr(member, '__module__') == mod.__name__
-        else:
-            # we take missing __module__ to mean the member is a data object
-            # it is recommended to filter data by e.g. __all__
+        if typ == objtype:
             return True
+        if directivetype is not None:
+            return roles[typ] == directivetype
 
     if typ is not None and typ not in roles:
         raise ValueError("typ must be None or one of %s"
@@ -209,49 +641,53 @@ def _get_members(
         known_refs = {}
     elif isinstance(known_refs, str):
         known_refs = getattr(mod, known_refs)
+    names = dir(mod)
     if in_list is not None:
         try:
-            in_list = getattr(mod, in_list)
-        except AttributeError:
-            in_list = []
-    for name in dir(mod):
-        if name.startswith('__'):
-            continue
-        try:
-            member = safe_getattr(mod, name)
+            in_list = set(getattr(mod, in_list))
         except AttributeError:
+            in_list = set()
+        names = [name for name in names if name in in_list]
+    if isinstance(mod, ModuleInventory):
+        members = mod.iter_members(names)
+    else:
+        members = _iter_members(mod, names)
+    # the documenter is only needed to classify the member, or to determine
+    # the role of references
+    need_type = typ is not None or out_format in ['table', 'refs']
+    use_documenter = _has_custom_documenters(APP)
+    for member in members:
+        name = member.name
+        if not (include_imported or member.is_local):
             continue
-        if check_typ(typ, mod, member):
-            if in_list is not None:
-                if name not in in_list:
-                    continue
-            if not (include_imported or is_local(mod, member, name)):
+        if need_type:
+            objtype, directivetype = member.get_type(use_documenter)
+            if not check_typ(typ, objtype, directivetype):
                 continue
-            if out_format in ['table', 'refs']:
-                documenter = _get_documenter(APP, member, mod)
-                role = roles.get(documenter.objtype, 'obj')
-                ref = _get_member_ref_str(
-                        name, obj=member, role=role,
-                        known_refs=known_refs)
-            if out_format == 'table':
-                docsummary = extract_summary(member)
-                item_table_tuples.append((ref, docsummary))
-                if not name.startswith('_'):
-                    public_table_tuples.append((ref, docsummary))
-            elif out_format == 'refs':
-                items.append(ref)
-                if not name.startswith('_'):
-                    public.append(ref)
-            elif out_format == 'fullnames':
-                fullname = _get_fullname(name, obj=member)
-                items.append(fullname)
-                if not name.startswith('_'):
-                    public.append(fullname)
-            else:
-                assert out_format == 'names', str(out_format)
-                items.append(name)
-                if not name.startswith('_'):
-                    public.append(name)
+        if out_format in ['table', 'refs']:
+            role = roles.get(objtype, 'obj')
+            ref = _get_member_ref_str(
+                    name, member.fullname, role=role,
+                    known_refs=known_refs)
+        if out_format == 'table':
+            docsummary = member.summary
+            item_table_tuples.append((ref, docsummary))
+            if not name.startswith('_'):
+                public_table_tuples.append((ref, docsummary))
+        elif out_format == 'refs':
+            items.append(ref)
+            if not name.startswith('_'):
+                public.append(ref)
+        elif out_format == 'fullnames':
+            fullname = member.fullname
+            items.append(fullname)
+            if not name.startswith('_'):
+                public.append(fullname)
+        else:
+            assert out_format == 'names', str(out_format)
+            items.append(name)
+            if not name.startswith('_'):
+                public.append(name)
     if out_format == 'table':
         return (_assemble_table(public_table_tuples),
                 _assemble_table(item_table_tuples))
@@ -316,14 +752,13 @@ def extract_summary(obj):
     return summary
 
 
-def _get_member_ref_str(name, obj, role='obj', known_refs=None):
-    """generate a ReST-formmated reference link to the given `obj` of type
-    `role`, using `name` as the link text"""
+def _get_member_ref_str(name, fullname, role='obj', known_refs=None):
+    """generate a ReST-formmated reference link to the object `fullname` of
+    type `role`, using `name` as the link text"""
     if known_refs is not None:
         if name in known_refs:
             return known_refs[name]
-    ref = _get_fullname(name, obj)
-    return ":%s:`%s <%s>`" % (role, name, ref)
+    return ":%s:`%s <%s>`" % (role, name, fullname)
 
 
 def _get_fullname(name, obj):
@@ -346,9 +781,215 @@ def _get_fullname(name, obj):
     return ref
 
 
-def _get_mod_ns(name, fullname, includeprivate):
+class _StubObject(object):
+    # Placeholder for a non-function, non-class module member that is known
+    # only from a stub file. Data members get their `__module__` set to the
+    # module that defines them, imported members additionally get `__name__`
+    # and `__qualname__`, so that `_get_fullname` locates them correctly.
+
+    def __init__(self, module, name=None):
+        self.__module__ = module
+        self.__doc__ = None
+        if name is not None:
+            self.__name__ = name
+            self.__qualname__ = name
+
+
+def _stub_function(name, modname, doc):
+    """Return a function object standing in for the function `name` declared
+    in a stub file"""
+    def function(*args, **kwargs):
+        pass
+    function.__name__ = name
+    function.__qualname__ = name
+    function.__module__ = modname
+    function.__doc__ = doc
+    return function
+
+
+def _stub_class(name, modname, doc, bases):
+    """Return a class standing in for the class `name` declared in a stub
+    file"""
+    bases = tuple(base for base in bases if inspect.isclass(base))
+    namespace = {'__module__': modname, '__qualname__': name, '__doc__': doc}
+    try:
+        return type(name, bases or (object, ), namespace)
+    except TypeError:  # e.g. inconsistent MRO
+        return type(name, (object, ), namespace)
+
+
+def _resolve_import(fullname, is_package, module, level):
+    """Return the absolute name of the module imported by ``from <module>
+    import ...`` inside the module `fullname`"""
+    if level == 0:
+        return module
+    parts = fullname.split('.')
+    if not is_package:
+        parts = parts[:-1]
+    if level > 1:
+        parts = parts[:-(level - 1)]
+    return makename('.'.join(parts), module)
+
+
+def _stub_module(fullname, source, filename, is_package=False):
+    """Build a module object for `fullname` from the stub file `source`
+    (in Python syntax), without importing anything"""
+    tree = ast.parse(source, filename)
+    mod = types.ModuleType(fullname, ast.get_docstring(tree))
+    mod.__file__ = filename
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            setattr(mod, node.name, _stub_function(
+                node.name, fullname, ast.get_docstring(node)))
+        elif isinstance(node, ast.ClassDef):
+            bases = []
+            for base in node.bases:
+                if isinstance(base, ast.Name):
+                    bases.append(getattr(
+                        mod, base.id, getattr(builtins, base.id, None)))
+            setattr(mod, node.name, _stub_class(
+                node.name, fullname, ast.get_docstring(node), bases))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            if isinstance(node, ast.Assign):
+                targets = node.targets
+            else:
+                targets = [node.target]
+            for target in targets:
+                if not isinstance(target, ast.Name):
+                    continue
+                if target.id == '__all__':
+                    try:
+                        mod.__all__ = list(ast.literal_eval(node.value))
+                    except ValueError:
+                        pass
+                else:
+                    setattr(mod, target.id, _StubObject(fullname))
+        elif isinstance(node, ast.ImportFrom):
+            modname = _resolve_import(
+                fullname, is_package, node.module, node.level)
+            for alias in node.names:
+                if alias.name == '*':
+                    continue
+                setattr(mod, alias.asname or alias.name,
+                        _StubObject(modname, alias.name))
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                name = alias.asname or alias.name.split('.')[0]
+                setattr(mod, name, types.ModuleType(alias.name))
+    return mod
+
+
+def _pyx_to_stub(source):
+    """Translate the Cython `source` into the source of a stub file that
+    declares the Python-visible functions, classes, data, and imports, with
+    their docstrings"""
+    lines = source.splitlines(True)
+    readline = iter(lines).__next__
+    stub = []
+    depth = 0
+    statement = []  # tokens of the current top-level logical line
+    header = None  # stub line for the def/class whose docstring we expect
+    first_statement = True
+    for tok in tokenize.generate_tokens(readline):
+        if tok.type == tokenize.INDENT:
+            depth += 1
+            continue
+        if tok.type == tokenize.DEDENT:
+            depth -= 1
+            continue
+        if tok.type in (tokenize.NL, tokenize.COMMENT):
+            continue
+        if header is not None and not statement:
+            # first token after a def/class header: the docstring, if the
+            # body is an indented block, or the next top-level statement,
+            # if the def/class fits on one line
+            if depth == 1 and tok.type == tokenize.STRING:
+                header += '    %s\n' % tok.string
+            else:
+                header += '    ...\n'
+            stub.append(header)
+            header = None
+        if depth > 0:
+            continue
+        if tok.type not in (tokenize.NEWLINE, tokenize.ENDMARKER):
+            statement.append(tok)
+            continue
+        if not statement:
+            continue
+        words = [t.string for t in statement]
+        names = [t.string for t in statement if t.type == tokenize.NAME]
+        text = ''.join(lines[statement[0].start[0] - 1:tok.end[0]])
+        if first_statement and all(
+                t.type == tokenize.STRING for t in statement):
+            stub.append(text.strip() + '\n')  # module docstring
+        elif words[0] in ('def', 'cpdef') and '(' in words:
+            name = words[words.index('(') - 1]
+            header = 'def %s(*args, **kwargs):\n' % name
+        elif 'class' in names and words[0] in ('class', 'cdef'):
+            i = words.index('class')
+            stub_line = 'class %s' % words[i + 1]
+            if len(words) > i + 2 and words[i + 2] == '(':
+                bases = words[i + 3:words.index(')', i + 2)]
+                stub_line += '(%s)' % ''.join(bases)
+            header = stub_line + ':\n'
+        elif words[0] in ('import', 'from') and 'cimport' not in words:
+            stub.append(text.strip() + '\n')
+        elif (statement[0].type == tokenize.NAME and len(words) > 1 and
+                words[1] in ('=', ':') and words[0] not in ('cdef', 'DEF')):
+            if words[0] == '__all__':
+                stub.append(text.strip() + '\n')
+            else:
+                stub.append('%s = ...\n' % words[0])
+        statement = []
+        first_statement = False
+    if header is not None:
+        stub.append(header + '    ...\n')
+    return ''.join(stub)
+
+
+def _import_module(fullname, source=None, inventory=None):
+    """Return the module `fullname` for introspection.
+
+    If `inventory` is given (a mapping of module names to
+    :class:`ModuleInventory` instances), the module is taken from it instead
+    of being imported.
+
+    If `source` is the path of a file with a suffix in `STUB_SUFFIXES` (a
+    Cython module), the module is not imported (which would require the
+    extension to be compiled). Instead, it is built from the adjacent ``.pyi``
+    stub file if it exists, or from the Cython source otherwise.
+    """
+    if inventory is not None:
+        try:
+            return inventory[fullname]
+        except KeyError:
+            raise ImportError(
+                "%r is not in the inventory (it only contains the modules "
+                "documented by --write-inventory)" % fullname)
+    if source is None or path.splitext(source)[1] not in STUB_SUFFIXES:
+        return importlib.import_module(fullname)
+    stubfile = path.splitext(source)[0] + '.pyi'
+    if path.isfile(stubfile):
+        with open(stubfile, encoding='utf-8') as in_fh:
+            stub = in_fh.read()
+        filename = stubfile
+    else:
+        with open(source, encoding='utf-8') as in_fh:
+            try:
+                stub = _pyx_to_stub(in_fh.read())
+            except (tokenize.TokenError, IndentationError) as e:
+                raise ImportError("cannot parse %s: %s" % (source, e))
+        filename = source
+    is_package = path.basename(path.splitext(source)[0]) == '__init__'
+    try:
+        return _stub_module(fullname, stub, filename, is_package)
+    except SyntaxError as e:
+        raise ImportError("cannot parse %s: %s" % (filename, e))
+
+
+def _get_mod_ns(name, fullname, includeprivate, source=None, inventory=None):
     """Return the template context of module identified by `fullname` as a
-    dict"""
+    dict. See `_import_module` for `source` and `inventory`."""
     ns = {  # template variables
         'name': name, 'fullname': fullname, 'members': [], 'functions': [],
         'classes': [], 'exceptions': [], 'subpackages': [], 'submodules': [],
@@ -356,7 +997,7 @@ def _get_mod_ns(name, fullname, includeprivate):
     p = 0
     if includeprivate:
         p = 1
-    mod = importlib.import_module(fullname)
+    mod = _import_module(fullname, source, inventory)
     ns['members'] = _get_members(mod)[p]
     ns['functions'] = _get_members(mod, typ='function')[p]
     ns['classes'] = _get_members(mod, typ='class')[p]
@@ -366,7 +1007,40 @@ def _get_mod_ns(name, fullname, includeprivate):
     return ns
 
 
-def add_get_members_to_template_env(template_env, fullname, opts):
+def _get_module_record(fullname, source=None):
+    """Import the module `fullname` and return everything `_get_members` and
+    `_get_mod_ns` need to know about it, as a JSON-serializable dict. See
+    `_import_module` for `source`."""
+    mod = _import_module(fullname, source)
+    use_documenter = _has_custom_documenters(APP)
+    members = []
+    for member in _iter_members(mod, dir(mod)):
+        objtype, directivetype = member.get_type(use_documenter)
+        members.append([
+            member.name, objtype, directivetype, member.is_local,
+            member.fullname, member.summary])
+    attributes = {}
+    for attr, value in vars(mod).items():
+        if attr == '__path__':
+            continue
+        if (isinstance(value, (list, tuple, set, frozenset)) and
+                all(isinstance(v, str) for v in value)):
+            attributes[attr] = sorted(value) if isinstance(
+                value, (set, frozenset)) else list(value)
+        elif (isinstance(value, dict) and
+                all(isinstance(k, str) and isinstance(v, str)
+                    for (k, v) in value.items())):
+            attributes[attr] = value
+    doc = mod.__doc__ if isinstance(mod.__doc__, str) else None
+    return {'doc': doc, 'members': members, 'attributes': attributes}
+
+
+def add_get_members_to_template_env(template_env, fullname, opts,
+                                    source=None, depends=()):
+
+    # source files of the modules, for `_import_module`
+    sources = dict(depends)
+    sources[fullname] = source
 
     def get_members(
             fullname, typ=None, include_imported=False, out_format='names',
@@ -421,7 +1095,8 @@ def add_get_members_to_template_env(template_env, fullname, opts):
             use ``include_imported=True`` to get the full list (as packages
             typically export members imported from their sub-modules)
         """
-        mod = importlib.import_module(fullname)
+        inventory = getattr(opts, 'inventory', None)
+        mod = _import_module(fullname, sources.get(fullname), inventory)
         p = 0
         if includeprivate:
             p = 1
@@ -434,114 +1109,507 @@ def add_get_members_to_template_env(template_env, fullname, opts):
         get_members, fullname=fullname)
 
 
-def create_package_file(root, master_package, subroot, py_files, opts, subs, is_namespace):
-    # type: (unicode, unicode, unicode, List[unicode], Any, List[unicode], bool) -> None
-    """Build the text of the file and write the file."""
+def _render_template(template_env, template_name, name, fullname, opts,
+                     source=None, depends=(), **ns):
+    """Render `template_name` for the module `fullname`, with the template
+    variables from `_get_mod_ns` updated by `ns`. Return None if the module
+    cannot be imported. The ``(fullname, source)`` pairs in `depends` give
+    the source files of other modules for ``get_members`` (see
+    `_import_module`)."""
+    add_get_members_to_template_env(
+        template_env, fullname, opts, source=source, depends=depends)
+    try:
+        mod_ns = _get_mod_ns(
+            name=name, fullname=fullname,
+            includeprivate=opts.includeprivate, source=source,
+            inventory=getattr(opts, 'inventory', None))
+        mod_ns.update(ns)
+        template = template_env.get_template(template_name)
+        return template.render(**mod_ns)
+    except ImportError as e:
+        _warn('failed to import %r: %s' % (fullname, e))
+
+
+def _try_module_record(fullname, source=None):
+    """Return `_get_module_record` for the module `fullname`, or None (with a
+    warning) if the module cannot be imported"""
+    try:
+        return _get_module_record(fullname, source)
+    except ImportError as e:
+        _warn('failed to import %r: %s' % (fullname, e))
+
+
+# Options of the main() call that created the IntrospectionPool, as seen by
+# its worker processes
+_POOL_OPTS = None
+
+
+def _pool_render(sys_path, template_name, name, fullname, source, depends,
+                 ns):
+    """Call `_render_template` in a worker of an `IntrospectionPool`"""
+    sys.path[:] = sys_path
+    opts = _POOL_OPTS
+    return _render_template(
+        _get_template_env(opts.templates), template_name, name, fullname,
+        opts, source=source, depends=depends, **ns)
+
+
+def _pool_module_record(sys_path, fullname, source):
+    """Call `_try_module_record` in a worker of an `IntrospectionPool`"""
+    sys.path[:] = sys_path
+    return _try_module_record(fullname, source)
+
+
+class IntrospectionPool(object):
+    """Pool of `workers` processes that import and introspect modules.
+
+    All workers are forked when the pool is created, after the modules given
+    with ``--preload`` were imported in the current process. Thus, every
+    worker starts with the preloaded modules, and keeps the modules it
+    imports and the templates it compiles for all further pages.
+
+    The result of each task is passed to the callback given to
+    :meth:`submit` in the current process, in the order in which the tasks
+    were submitted. At most `max_pending` tasks are pending; :meth:`submit`
+    blocks until earlier tasks are finished. An exception raised by a task is
+    re-raised when its result is collected.
+    """
+
+    def __init__(self, workers, opts, max_pending=None):
+        # type: (int, Any, int) -> None
+        global _POOL_OPTS
+        _POOL_OPTS = opts
+        if max_pending is None:
+            max_pending = 4 * workers
+        self.max_pending = max_pending
+        self._pending = deque()  # type: deque
+        self._pool = multiprocessing.get_context('fork').Pool(workers)
+        self._closed = False
+
+    def _finish_next(self):
+        result, callback = self._pending.popleft()
+        callback(result.get())
+
+    def submit(self, callback, func, *args):
+        """Evaluate ``func(*args)`` in a worker, and pass the result to
+        ``callback``."""
+        self._pending.append((self._pool.apply_async(func, args), callback))
+        while len(self._pending) > self.max_pending:
+            self._finish_next()
+
+    def close(self):
+        # type: () -> None
+        """Wait for all pending tasks and shut down the workers."""
+        while self._pending:
+            self._finish_next()
+        self._pool.close()
+        self._pool.join()
+        self._closed = True
+
+    def terminate(self):
+        # type: () -> None
+        """Shut down the workers, discarding all pending tasks."""
+        if not self._closed:
+            self._pending.clear()
+            self._pool.terminate()
+            self._pool.join()
+            self._closed = True
+
+
+class _LRUCache(object):
+    """Mapping of at most `maxsize` items that evicts the least recently used
+    items first"""
+
+    def __init__(self, maxsize):
+        # type: (int) -> None
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # type: OrderedDict
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        self._data[key] = value
+        return value
+
+    def set(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        self.resize(self.maxsize)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def resize(self, maxsize):
+        # type: (int) -> None
+        """Set `maxsize`, evicting items as necessary."""
+        self.maxsize = maxsize
+        while len(self._data) > max(maxsize, 0):
+            self._data.popitem(last=False)
+
+
+# Caches that persist across calls to `main` in the same process (e.g.,
+# when `main` is called from conf.py under sphinx-autobuild)
+_TEMPLATE_ENVS = {}  # type: Dict[unicode, SandboxedEnvironment]
+_PAGE_CACHE = _LRUCache(0)
+# Source stamps (see `_file_stamp`) of the imported modules, as of their last
+# import or reload by `_render_page`
+_MODULE_STAMPS = {}  # type: Dict[unicode, Tuple[int, int]]
+
+
+def _uses_templates(opts):
+    # type: (Any) -> bool
+    """Check whether pages are created from templates, possibly deferred to
+    rendering an inventory file (``--write-inventory``)"""
+    return bool(opts.templates or getattr(opts, 'write_inventory', None))
+
+
+def _get_template_env(templates):
+    # type: (unicode) -> SandboxedEnvironment
+    """Return the (cached) template environment for the template directory
+    `templates`, or None if `templates` is None. The environment re-loads
+    templates that change on disk."""
+    if templates is None:
+        return None
+    templates = path.abspath(templates)
+    if templates not in _TEMPLATE_ENVS:
+        template_loader = FileSystemLoader(templates)
+        _TEMPLATE_ENVS[templates] = SandboxedEnvironment(
+            loader=template_loader)
+    return _TEMPLATE_ENVS[templates]
+
+
+def _file_stamp(fname):
+    # type: (unicode) -> Tuple[int, int]
+    """Return modification time and size of `fname`, or None if the file does
+    not exist"""
+    try:
+        stat = os.stat(fname)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _templates_stamp(templates):
+    # type: (unicode) -> Tuple
+    """Return the stamps of all files in the template directory"""
+    stamps = []
+    for root, _, files in walk(templates):
+        for filename in sorted(files):
+            fname = path.join(root, filename)
+            stamps.append((fname, _file_stamp(fname)))
+    return tuple(stamps)
+
+
+def _reload_changed_modules(fullname, source, depends=()):
+    # type: (unicode, unicode, List[Tuple[unicode, unicode]]) -> List[Tuple[unicode, Tuple]]
+    """Reload each of the modules in `depends` (``(fullname, source)`` pairs)
+    that was imported before and whose source changed since, and then the
+    module `fullname` if its `source` changed or any of the `depends` was
+    reloaded. Return the current stamps of all sources, for
+    `_record_module_stamps`."""
+    stamps = []
+    reloaded = False
+    for (modname, modsource) in list(depends) + [(fullname, source)]:
+        stamp = _file_stamp(modsource) if modsource else None
+        stamps.append((modname, stamp))
+        if modname not in sys.modules:
+            continue
+        if ((modname == fullname and reloaded) or
+                _MODULE_STAMPS.get(modname, stamp) != stamp):
+            reloaded = True
+            try:
+                importlib.reload(sys.modules[modname])
+            except Exception as e:
+                _warn('failed to reload %r: %s' % (modname, e))
+    return stamps
+
+
+def _record_module_stamps(stamps):
+    # type: (List[Tuple[unicode, Tuple]]) -> None
+    """Record the `stamps` returned by `_reload_changed_modules` for all
+    modules that are imported now"""
+    for (modname, stamp) in stamps:
+        if modname in sys.modules:
+            _MODULE_STAMPS[modname] = stamp
+
+
+def _render_page(template_env, template_name, name, fullname, opts, text,
+                 source=None, depends=(), **ns):
+    """Render `template_name` for the module `fullname` (see
+    `_render_template`) and write the page `fullname`. If the module cannot be
+    imported, write `text` instead.
+
+    If the page cache is enabled (``--cache-size``), the page is only
+    re-rendered if the source file of the module, the source file of any of
+    the modules in `depends` (a sequence of ``(fullname, source)`` pairs,
+    e.g. the submodules of a package), or any file in the template directory
+    changed since the page was last rendered.
+
+    Independently of the page cache, previously imported modules whose source
+    changed since they were imported are reloaded, the modules in `depends`
+    before the module itself.
+
+    With ``--write-inventory``, the module and all modules in `depends` are
+    only introspected, and the page is recorded in the inventory instead of
+    being rendered.
+
+    With ``--preload``, the module is introspected in a worker of the
+    `IntrospectionPool` ``opts.pool``, and the page is written once the
+    result is available.
+    """
+    pool = getattr(opts, 'pool', None)
+    module_stamps = _reload_changed_modules(fullname, source, depends)
+    if getattr(opts, 'write_inventory', None):
+        writer = opts.writer
+
+        def introspect(callback, modname, modsource):
+            if pool is not None:
+                pool.submit(callback, _pool_module_record, list(sys.path),
+                            modname, modsource)
+            else:
+                callback(_try_module_record(modname, modsource))
+
+        def add_record(modname, record):
+            if record is not None:
+                writer.add_module(modname, record)
+
+        def write_record(record):
+            if record is not None and writer is not None:
+                writer.add_module(fullname, record)
+                writer.add_template(
+                    fullname, template_name, name=name, fullname=fullname,
+                    ns=ns)
+            _record_module_stamps(module_stamps)
+            write_file(fullname, text, opts)
+
+        if writer is not None:
+            # `get_members` may be called for any of the `depends` (e.g.
+            # submodules without a page of their own)
+            writer.claim_module(fullname)
+            for (depname, depsource) in depends:
+                if writer.claim_module(depname):
+                    introspect(partial(add_record, depname), depname,
+                               depsource)
+        introspect(write_record, fullname, source)
+        return
+    key = None
+    if _PAGE_CACHE.maxsize > 0:
+        key = (path.abspath(opts.templates), template_name, fullname,
+               opts.includeprivate, repr(sorted(ns.items())))
+        templates_stamp = getattr(opts, 'templates_stamp', None)
+        if templates_stamp is None:
+            templates_stamp = _templates_stamp(opts.templates)
+        module_stamp = (
+            _file_stamp(source) if source else None,
+            tuple((fname, _file_stamp(fname)) for (_, fname) in depends))
+        stamp = (module_stamp, templates_stamp)
+        cached = _PAGE_CACHE.get(key)
+        if cached is not None:
+            cached_stamp, cached_text = cached
+            if cached_stamp == stamp:
+                write_file(fullname, cached_text, opts)
+                return
+
+    def write_rendered(rendered):
+        _record_module_stamps(module_stamps)
+        if key is not None:
+            if rendered is None:
+                _PAGE_CACHE.pop(key)
+            else:
+                _PAGE_CACHE.set(key, (stamp, rendered))
+        write_file(fullname, rendered or text, opts)
+
+    if pool is not None:
+        pool.submit(write_rendered, _pool_render, list(sys.path),
+                    template_name, name, fullname, source, list(depends), ns)
+    else:
+        write_rendered(_render_template(
+            template_env, template_name, name, fullname, opts,
+            source=source, depends=depends, **ns))
+
+
+def create_package_file(root, master_package, subroot, py_files, opts, subs, is_namespace,
+                        only_submodules=None):
+    # type: (unicode, unicode, unicode, List[unicode], Any, List[unicode], bool, Set[unicode]) -> None
+    """Build the text of the file and write the file.
+
+    If `only_submodules` is given, only the files for the submodules in
+    `only_submodules` are written in addition to the package file (for
+    ``--separate``).
+    """
+    # build a list of directories that are subpackages (contain an INITPY file)
+    subpackages = [sub for sub in subs
+                   if path.isfile(path.join(root, sub, INITPY))]
+    module_files = [sub for sub in py_files
+                    if not shall_skip(path.join(root, sub), opts) and
+                    sub != INITPY]
+    _create_package_file(root, master_package, subroot, subpackages,
+                         module_files, opts, is_namespace, only_submodules)
+
+
+def _create_package_file(root, master_package, subroot, subpackages,
+                         module_files, opts, is_namespace,
+                         only_submodules=None):
+    # type: (unicode, unicode, unicode, List[unicode], List[unicode], Any, bool, Set[unicode]) -> None
+    """Implementation of `create_package_file`, for the given (filtered)
+    list of `subpackages` and the file names of the submodules to document
+    in `module_files`."""
 
     use_templates = False
     fullname = makename(master_package, subroot)
 
-    if opts.templates:
+    if _uses_templates(opts):
         use_templates = True
-        template_loader = FileSystemLoader(opts.templates)
-        template_env = SandboxedEnvironment(loader=template_loader)
+        template_env = _get_template_env(opts.templates)
 
-    text = format_heading(
-        1, ('%s package' if not is_namespace else "%s namespace") % fullname)
+    parts = [format_heading(
+        1, ('%s package' if not is_namespace else "%s namespace") % fullname)]
 
     if opts.modulefirst and not is_namespace:
-        text += format_directive(subroot, master_package)
-        text += '\n'
+        parts.append(format_directive(subroot, master_package))
+        parts.append('\n')
 
-    # build a list of directories that are szvpackages (contain an INITPY file)
-    subs = [sub for sub in subs if path.isfile(path.join(root, sub, INITPY))]
     # if there are some package directories, add a TOC for theses subpackages
-    if subs:
-        text += format_heading(2, 'Subpackages')
-        text += '.. toctree::\n\n'
-        for sub in subs:
-            text += '    %s.%s\n' % (makename(master_package, subroot), sub)
-        text += '\n'
+    if subpackages:
+        parts.append(format_heading(2, 'Subpackages'))
+        parts.append('.. toctree::\n\n')
+        parts.extend('    %s.%s\n' % (fullname, sub) for sub in subpackages)
+        parts.append('\n')
 
-    submods = [path.splitext(sub)[0] for sub in py_files
-               if not shall_skip(path.join(root, sub), opts) and
-               sub != INITPY]
-
-    if use_templates:
-        try:
-            package_ns = _get_mod_ns(name=subroot, fullname=fullname,
-                                     includeprivate=opts.includeprivate)
-            package_ns['subpackages'] = subs
-            package_ns['submodules'] = submods
-        except ImportError as e:
-            _warn('failed to import %r: %s' % (fullname, e))
+    submods = [path.splitext(sub)[0] for sub in module_files]
+    submod_sources = {submod: path.join(root, sub)
+                      for (submod, sub) in zip(submods, module_files)}
 
     if submods:
-        text += format_heading(2, 'Submodules')
+        parts.append(format_heading(2, 'Submodules'))
         if opts.separatemodules:
-            text += '.. toctree::\n\n'
+            parts.append('.. toctree::\n\n')
             for submod in submods:
-                modfile = makename(master_package, makename(subroot, submod))
-                text += '   %s\n' % modfile
+                modfile = makename(fullname, submod)
+                parts.append('   %s\n' % modfile)
+                if (only_submodules is not None and
+                        submod not in only_submodules):
+                    continue
 
                 # generate separate file for this module
                 if not opts.noheadings:
                     filetext = format_heading(1, '%s module' % modfile)
                 else:
                     filetext = ''
-                filetext += format_directive(makename(subroot, submod),
-                                             master_package)
+                filetext += format_directive(modfile)
                 if use_templates:
-                    try:
-                        mod_ns = _get_mod_ns(
-                            name=submod, fullname=modfile,
-                            includeprivate=opts.includeprivate)
-                        template = template_env.get_template('module.rst')
-                        add_get_members_to_template_env(
-                            template_env, modfile, opts)
-                        filetext = template.render(**mod_ns)
-                    except ImportError as e:
-                        _warn('failed to import %r: %s' % (modfile, e))
-                write_file(modfile, filetext, opts)
+                    _render_page(
+                        template_env, 'module.rst', submod, modfile, opts,
+                        filetext, source=submod_sources[submod])
+                else:
+                    write_file(modfile, filetext, opts)
         else:
             for submod in submods:
-                modfile = makename(master_package, makename(subroot, submod))
+                modfile = makename(fullname, submod)
                 if not opts.noheadings:
-                    text += format_heading(2, '%s module' % modfile)
-                text += format_directive(makename(subroot, submod),
-                                         master_package)
-                text += '\n'
-        text += '\n'
+                    parts.append(format_heading(2, '%s module' % modfile))
+                parts.append(format_directive(modfile))
+                parts.append('\n')
+        parts.append('\n')
+
+    if not use_templates and not opts.modulefirst and not is_namespace:
+        parts.append(format_heading(2, 'Module contents'))
+        parts.append(format_directive(subroot, master_package))
+    text = ''.join(parts)
 
     if use_templates:
-        template = template_env.get_template('package.rst')
-        add_get_members_to_template_env(template_env, fullname, opts)
-        text = template.render(**package_ns)
+        _render_page(
+            template_env, 'package.rst', subroot, fullname, opts, text,
+            source=path.join(root, INITPY),
+            depends=[(makename(fullname, submod), submod_sources[submod])
+                     for submod in submods],
+            subpackages=subpackages, submodules=submods)
     else:
-        if not opts.modulefirst and not is_namespace:
-            text += format_heading(2, 'Module contents')
-            text += format_directive(subroot, master_package)
-
-    write_file(makename(master_package, subroot), text, opts)
+        write_file(fullname, text, opts)
 
 
 def create_modules_toc_file(modules, opts, name='modules'):
     # type: (List[unicode], Any, unicode) -> None
     """Create the module's index."""
-    text = format_heading(1, '%s' % opts.header)
-    text += '.. toctree::\n'
-    text += '   :maxdepth: %s\n\n' % opts.maxdepth
+    parts = [format_heading(1, '%s' % opts.header), '.. toctree::\n',
+             '   :maxdepth: %s\n\n' % opts.maxdepth]
+    parts.extend(_modules_toc_entries(modules))
 
+    write_file(name, ''.join(parts), opts)
+
+
+def _modules_toc_entries(modules):
+    # type: (List[unicode]) -> List[unicode]
+    """Return the toctree lines of the module index for `modules`"""
+    entries = []
     modules.sort()
-    prev_module = ''  # type: unicode
+    prefix = '.'  # prefix of subpackages of the previous module
     for module in modules:
         # look if the module is a subpackage and, if yes, ignore it
-        if module.startswith(prev_module + '.'):
+        if module.startswith(prefix):
             continue
-        prev_module = module
-        text += '   %s\n' % module
+        prefix = module + '.'
+        entries.append('   %s\n' % module)
+    return entries
+
+
+def _split_modules_toc(lines):
+    # type: (List[unicode]) -> Tuple[List[unicode], List[unicode], List[unicode]]
+    """Split the `lines` of a module index into the lines up to and including
+    the options of its toctree, the toctree entries, and all following
+    lines"""
+    head, entries, tail = [], [], []  # type: List[unicode], List[unicode], List[unicode]
+    in_toctree = False
+    for line in lines:
+        if tail:
+            tail.append(line)
+        elif not in_toctree:
+            head.append(line)
+            in_toctree = line.startswith('.. toctree::')
+        elif line.startswith('   ') and line.strip():
+            if line.strip().startswith(':') and not entries:
+                head.append(line)
+            else:
+                entries.append(line)
+        elif entries:
+            tail.append(line)
+        else:
+            head.append(line)
+    return head, entries, tail
 
-    write_file(name, text, opts)
+
+def patch_modules_toc_file(modules, opts, name='modules'):
+    # type: (List[unicode], Any, unicode) -> None
+    """Add `modules` to the existing module index. Only the toctree entries
+    are rewritten; the heading, the toctree options, and any other content
+    are kept."""
+    if not modules:
+        return
+    fname = path.join(opts.destdir, '%s.%s' % (name, opts.suffix))
+    if not path.isfile(fname):
+        _warn('no module index %s.%s to update in %s'
+              % (name, opts.suffix, opts.destdir))
+        return
+    with open(fname, encoding='utf-8') as in_fh:
+        head, entries, tail = _split_modules_toc(in_fh.readlines())
+    if not any(line.startswith('.. toctree::') for line in head):
+        _warn('module index %s.%s in %s has no toctree; not updating it'
+              % (name, opts.suffix, opts.destdir))
+        return
+    existing = [entry.strip() for entry in entries]
+    if not entries:
+        # separate the new entries from the toctree options
+        if not head[-1].endswith('\n'):
+            head[-1] += '\n'
+        if head[-1].strip():
+            head.append('\n')
+    entries = _modules_toc_entries(sorted(set(existing + modules)))
+    write_file(name, ''.join(head + entries + tail), opts)
 
 
 def shall_skip(module, opts):
@@ -551,86 +1619,321 @@ def shall_skip(module, opts):
     if not opts.implicit_namespaces and not path.exists(module):
         return True
 
+    size = path.getsize(module) if path.exists(module) else None
+    return _shall_skip_file(path.basename(module), size, opts)
+
+
+def _shall_skip_file(filename, size, opts):
+    # type: (unicode, int, Any) -> bool
+    """Check if we want to skip the module file `filename` of the given
+    `size` (None if the file does not exist)."""
     # skip it if there is nothing (or just \n or \r\n) in the file
-    if path.exists(module) and path.getsize(module) <= 2:
+    if size is not None and size <= 2:
         return True
 
     # skip if it has a "private" name and this is selected
-    filename = path.basename(module)
     if filename != '__init__.py' and filename.startswith('_') and \
        not opts.includeprivate:
         return True
     return False
 
 
-def recurse_tree(rootpath, excludes, opts):
-    # type: (unicode, List[unicode], Any) -> List[unicode]
-    """
-    Look for every file in the directory tree and create the corresponding
-    ReST files.
-    """
-    # check if the base directory is a package and get its name
+def get_root_package(rootpath):
+    # type: (unicode) -> unicode
+    """Return the name of the package at `rootpath`, or None if `rootpath` is
+    a directory with packages."""
     if INITPY in os.listdir(rootpath):
-        root_package = rootpath.split(path.sep)[-1]
+        return rootpath.split(path.sep)[-1]
     else:
-        # otherwise, the base is a directory with packages
-        root_package = None
+        return None
+
+
+def filter_py_files(root, files, excludes):
+    # type: (unicode, List[unicode], List[unicode]) -> List[unicode]
+    """Return the sorted Python module files in `files` (that aren't
+    excluded), with INITPY first."""
+    py_files = sorted(f for f in files
+                      if path.splitext(f)[1] in PY_SUFFIXES and
+                      not is_excluded(path.join(root, f), excludes))
+    if INITPY in py_files:
+        py_files.remove(INITPY)
+        py_files.insert(0, INITPY)
+    return py_files
+
+
+def filter_subs(root, subs, excludes, opts):
+    # type: (unicode, List[unicode], List[unicode], Any) -> List[unicode]
+    """Return the sorted subdirectories in `subs` without hidden ('.') and
+    private ('_') directories, as well as excluded dirs."""
+    if getattr(opts, 'includeprivate', False):
+        exclude_prefixes = ('.',)  # type: Tuple[unicode, ...]
+    else:
+        exclude_prefixes = ('.', '_')
+    return sorted(sub for sub in subs if not sub.startswith(exclude_prefixes) and
+                  not is_excluded(path.join(root, sub), excludes))
 
-    toplevels = []
+
+# A directory visited by `recurse_tree`, see `scan_tree`
+TreeNode = namedtuple('TreeNode', [
+    'root', 'py_files', 'subs', 'subpackages', 'module_files', 'is_pkg',
+    'is_namespace', 'skip_init'])
+
+
+def scan_tree(rootpath, excludes, opts):
+    # type: (unicode, List[unicode], Any) -> List[TreeNode]
+    """
+    Scan the directory tree at `rootpath` (listing each directory once) and
+    return a `TreeNode` for every directory for which `recurse_tree` creates
+    ReST files, in the order of :func:`os.walk`.
+
+    Each node contains the `root` directory, the Python module files
+    `py_files` (with INITPY first), the subdirectories `subs` to descend
+    into, the `subpackages` among them (the subdirectories containing an
+    INITPY file), the `module_files` to document (all `py_files` except
+    INITPY, for which `shall_skip` is False), whether the directory is a
+    package or namespace, and whether `shall_skip` is True for its INITPY.
+    """
     followlinks = getattr(opts, 'followlinks', False)
-    includeprivate = getattr(opts, 'includeprivate', False)
     implicit_namespaces = getattr(opts, 'implicit_namespaces', False)
-    for root, subs, files in walk(rootpath, followlinks=followlinks):
+    nodes = []  # type: List[TreeNode]
+
+    def scan(root):
+        # type: (unicode) -> bool
+        """Add the nodes for the tree at `root`, return whether `root`
+        contains an INITPY file"""
+        try:
+            entries = list(os.scandir(root))
+        except OSError:
+            return False
+        files = {}  # type: Dict[unicode, os.DirEntry]
+        dirs = {}  # type: Dict[unicode, os.DirEntry]
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                dirs[entry.name] = entry
+            else:
+                files[entry.name] = entry
+        has_init = INITPY in files
         # document only Python module files (that aren't excluded)
-        py_files = sorted(f for f in files
-                          if path.splitext(f)[1] in PY_SUFFIXES and
-                          not is_excluded(path.join(root, f), excludes))
+        py_files = filter_py_files(root, list(files), excludes)
         is_pkg = INITPY in py_files
         is_namespace = INITPY not in py_files and implicit_namespaces
-        if is_pkg:
-            py_files.remove(INITPY)
-            py_files.insert(0, INITPY)
-        elif root != rootpath:
-            # only accept non-package at toplevel unless using implicit namespaces
-            if not implicit_namespaces:
-                del subs[:]
-                continue
-        # remove hidden ('.') and private ('_') directories, as well as
-        # excluded dirs
-        if includeprivate:
-            exclude_prefixes = ('.',)  # type: Tuple[unicode, ...]
+        if not is_pkg and root != rootpath and not implicit_namespaces:
+            # only accept non-package at toplevel unless using implicit
+            # namespaces
+            return has_init
+        subs = filter_subs(root, list(dirs), excludes, opts)
+        index = len(nodes)
+        nodes.append(None)  # placeholder, to be filled after the subs
+        subpackages = []
+        for sub in subs:
+            if followlinks or not dirs[sub].is_symlink():
+                sub_has_init = scan(dirs[sub].path)
+            else:
+                sub_has_init = path.isfile(path.join(root, sub, INITPY))
+            if sub_has_init:
+                subpackages.append(sub)
+        sizes = {}
+        for py_file in py_files:
+            try:
+                sizes[py_file] = files[py_file].stat().st_size
+            except OSError:
+                sizes[py_file] = None
+        module_files = [f for f in py_files if f != INITPY and
+                        not _shall_skip_file(f, sizes[f], opts)]
+        if has_init:
+            skip_init = _shall_skip_file(
+                INITPY, files[INITPY].stat().st_size, opts)
         else:
-            exclude_prefixes = ('.', '_')
-        subs[:] = sorted(sub for sub in subs if not sub.startswith(exclude_prefixes) and
-                         not is_excluded(path.join(root, sub), excludes))
+            skip_init = not implicit_namespaces
+        nodes[index] = TreeNode(
+            root, py_files, subs, subpackages, module_files, is_pkg,
+            is_namespace, skip_init)
+        return has_init
 
-        if is_pkg or is_namespace:
+    scan(rootpath)
+    return nodes
+
+
+def recurse_tree(rootpath, excludes, opts):
+    # type: (unicode, List[unicode], Any) -> List[unicode]
+    """
+    Look for every file in the directory tree and create the corresponding
+    ReST files.
+    """
+    # check if the base directory is a package and get its name
+    root_package = get_root_package(rootpath)
+
+    toplevels = []
+    for node in scan_tree(rootpath, excludes, opts):
+        root = node.root
+        if node.is_pkg or node.is_namespace:
             # we are in a package with something to document
-            if subs or len(py_files) > 1 or not shall_skip(path.join(root, INITPY), opts):
+            if node.subs or len(node.py_files) > 1 or not node.skip_init:
                 subpackage = root[len(rootpath):].lstrip(path.sep).\
                     replace(path.sep, '.')
                 # if this is not a namespace or
                 # a namespace and there is something there to document
-                if not is_namespace or len(py_files) > 0:
-                    create_package_file(root, root_package, subpackage,
-                                        py_files, opts, subs, is_namespace)
+                if not node.is_namespace or len(node.py_files) > 0:
+                    _create_package_file(
+                        root, root_package, subpackage, node.subpackages,
+                        node.module_files, opts, node.is_namespace)
                     toplevels.append(makename(root_package, subpackage))
         else:
             # if we are at the root level, we don't require it to be a package
             assert root == rootpath and root_package is None
-            if opts.templates:
+            if _uses_templates(opts):
                 sys.path.insert(0, rootpath)
-            for py_file in py_files:
-                if not shall_skip(path.join(rootpath, py_file), opts):
-                    module = path.splitext(py_file)[0]
-                    create_module_file(root_package, module, opts)
-                    toplevels.append(module)
-            if opts.templates:
+            for py_file in node.module_files:
+                module = path.splitext(py_file)[0]
+                create_module_file(
+                    root_package, module, opts,
+                    source=path.join(rootpath, py_file))
+                toplevels.append(module)
+            if _uses_templates(opts):
                 sys.path.pop(0)
 
     return toplevels
 
 
+def regenerate_modules(rootpath, excludes, opts, modules):
+    # type: (unicode, List[unicode], Any, List[unicode]) -> List[unicode]
+    """
+    Create the ReST files for only the given `modules` (dotted names of
+    modules or packages below `rootpath`) and for their parent packages,
+    without walking the directory tree. Return the names to add to the
+    module index.
+
+    Names that `recurse_tree` would not document (e.g. private or excluded
+    modules) are skipped with a warning.
+    """
+    root_package = get_root_package(rootpath)
+    implicit_namespaces = getattr(opts, 'implicit_namespaces', False)
+    followlinks = getattr(opts, 'followlinks', False)
+
+    def is_package_dir(dirname):
+        init = path.join(dirname, INITPY)
+        return ((path.isfile(init) and not is_excluded(init, excludes)) or
+                (implicit_namespaces and path.isdir(dirname)))
+
+    def is_documented_dir(dirname):
+        """Whether `recurse_tree` descends into `dirname`"""
+        while dirname != rootpath:
+            parent, sub = path.split(dirname)
+            if (not filter_subs(parent, [sub], excludes, opts) or
+                    not is_package_dir(dirname) or
+                    (path.islink(dirname) and not followlinks)):
+                return False
+            dirname = parent
+        return True
+
+    # package directory => names of submodules to write, in addition to the
+    # package file
+    packages = OrderedDict()  # type: OrderedDict
+    requested = {}  # type: Dict[unicode, unicode]
+    toplevel_files = []  # type: List[unicode]
+    for module in modules:
+        parts = module.split('.')
+        if root_package is not None:
+            if parts[0] != root_package:
+                _warn('%r is not in package %r' % (module, root_package))
+                continue
+            parts = parts[1:]
+        dirname = path.join(rootpath, *parts)
+        if parts and path.isdir(dirname) and is_package_dir(dirname):
+            if not is_documented_dir(dirname):
+                _warn('%r is not documented (private, excluded, or not in '
+                      'a package)' % module)
+                continue
+            requested[dirname] = module
+            packages.setdefault(dirname, set())
+            parent = path.dirname(dirname)
+            if parent != rootpath or root_package is not None:
+                packages.setdefault(parent, set())
+            continue
+        if not parts and root_package is not None:
+            requested[rootpath] = module
+            packages.setdefault(rootpath, set())
+            continue
+        parent = path.join(rootpath, *parts[:-1])
+        for suffix in sorted(PY_SUFFIXES):
+            if path.isfile(path.join(parent, parts[-1] + suffix)):
+                py_file = parts[-1] + suffix
+                break
+        else:
+            _warn('cannot find module %r in %s' % (module, rootpath))
+            continue
+        if (is_excluded(path.join(parent, py_file), excludes) or
+                not is_documented_dir(parent) or
+                shall_skip(path.join(parent, py_file), opts)):
+            _warn('%r is not documented (private, empty, excluded, or not '
+                  'in a package)' % module)
+            continue
+        if parent == rootpath and root_package is None:
+            toplevel_files.append(py_file)
+        else:
+            packages.setdefault(parent, set()).add(parts[-1])
+
+    toplevels = []
+    for root, submodules in packages.items():
+        files, subs = [], []
+        for entry in os.listdir(root):
+            if path.isdir(path.join(root, entry)):
+                subs.append(entry)
+            else:
+                files.append(entry)
+        py_files = filter_py_files(root, files, excludes)
+        subs = filter_subs(root, subs, excludes, opts)
+        is_namespace = INITPY not in py_files and implicit_namespaces
+        skip_init = shall_skip(path.join(root, INITPY), opts)
+        # the same conditions as in `recurse_tree`
+        if (not (subs or len(py_files) > 1 or not skip_init) or
+                (is_namespace and not py_files)):
+            if root in requested:
+                _warn('%r has nothing to document' % requested[root])
+            continue
+        subpackage = root[len(rootpath):].lstrip(path.sep).\
+            replace(path.sep, '.')
+        create_package_file(root, root_package, subpackage, py_files, opts,
+                            subs, is_namespace, only_submodules=submodules)
+        toplevels.append(makename(root_package, subpackage))
+    if toplevel_files:
+        if _uses_templates(opts):
+            sys.path.insert(0, rootpath)
+        for py_file in toplevel_files:
+            module = path.splitext(py_file)[0]
+            create_module_file(
+                root_package, module, opts,
+                source=path.join(rootpath, py_file))
+            toplevels.append(module)
+        if _uses_templates(opts):
+            sys.path.pop(0)
+
+    return toplevels
+
+
+def render_inventory(filename, opts):
+    # type: (unicode, Any) -> None
+    """Create the ReST files for all pages in the inventory file `filename`
+    (written with ``--write-inventory``), rendering the templated pages with
+    the templates in ``opts.templates``, without importing any modules."""
+    inventory = read_inventory(filename)
+    opts.inventory = {
+        fullname: ModuleInventory(fullname, record)
+        for (fullname, record) in inventory['modules'].items()}
+    template_env = _get_template_env(opts.templates)
+    for page in inventory['pages']:
+        text = page['text']
+        if 'template' in page:
+            text = _render_template(
+                template_env, page['template'], page['name'],
+                page['fullname'], opts, **page['ns']) or text
+        write_file(page['page'], text, opts)
+
+
 def normalize_excludes(rootpath, excludes):
     # type: (unicode, List[unicode]) -> List[unicode]
     """Normalize the excluded directory list."""
@@ -706,6 +2009,51 @@ Note: By default this script will not overwrite already created files.""")
     parser.add_option('-a', '--append-syspath', action='store_true',
                       dest='append_syspath',
                       help='Append module_path to sys.path, used when --full is given')
+    parser.add_option('--only', action='append', dest='only',
+                      metavar='MODULE', default=[],
+                      help='Only create the files for MODULE (dotted name of '
+                      'a module or package) and its parent package, and add '
+                      'them to the existing module index, instead of '
+                      'processing the entire <module_path> (may be given '
+                      'multiple times)')
+    parser.add_option('--write-inventory', action='store',
+                      dest='write_inventory', metavar='FILE', default=None,
+                      help='Only import and introspect the modules, and '
+                      'write the results and the list of pages to the '
+                      'inventory FILE (JSON, gzipped if FILE ends in .gz) '
+                      'instead of creating any output files')
+    parser.add_option('--from-inventory', action='store',
+                      dest='from_inventory', metavar='FILE', default=None,
+                      help='Create the output files from the inventory FILE '
+                      'written with --write-inventory and the templates '
+                      'given with -t, without importing any modules. '
+                      '<module_path> is not used')
+    parser.add_option('--preload', action='append', dest='preload',
+                      metavar='MODULE', default=[],
+                      help='Import MODULE before generating any pages, and '
+                      'import and introspect the documented modules in '
+                      'worker processes forked from that state (may be '
+                      'given multiple times, only with -t or '
+                      '--write-inventory)')
+    parser.add_option('--preload-workers', action='store',
+                      dest='preload_workers', type='int', default=None,
+                      help='Number of worker processes for --preload '
+                      '(default: number of CPUs)')
+    parser.add_option('--archive', action='store', dest='archive',
+                      metavar='FILE', default=None,
+                      help='Write all output files into the archive FILE '
+                      '(.zip, .tar, .tar.gz, .tgz, .tar.bz2, or .tar.xz) '
+                      'instead of into the output directory')
+    parser.add_option('--cache-size', action='store', dest='cache_size',
+                      type='int', default=0,
+                      help='Number of rendered pages to keep in memory for '
+                      'later calls of main() in the same process; pages '
+                      'are re-rendered only if their module or templates '
+                      'changed (default: %default, no caching; only with -t)')
+    parser.add_option('--write-workers', action='store', dest='write_workers',
+                      type='int', default=0,
+                      help='Number of background threads writing the output '
+                      'files (default: %default, write synchronously)')
     parser.add_option("-t", "--templates", action="store", type="string",
                       dest="templates", default=None,
                       help="Custom template directory (default: %default). "
@@ -736,82 +2084,133 @@ Note: By default this script will not overwrite already created files.""")
         print('better-apidoc %s' % __display_version__)
         return 0
 
-    if not args:
+    if opts.write_inventory and opts.from_inventory:
+        parser.error('--write-inventory and --from-inventory are exclusive.')
+    if opts.from_inventory:
+        if not opts.templates:
+            parser.error('Rendering an inventory requires templates (-t).')
+        rootpath, excludes = None, []
+    elif not args:
         parser.error('A package path is required.')
-
-    rootpath, excludes = args[0], args[1:]
-    if not opts.destdir:
+    else:
+        rootpath, excludes = args[0], args[1:]
+    if opts.preload and opts.write_workers > 0:
+        parser.error('--preload and --write-workers are exclusive.')
+    if opts.preload and not (opts.templates or opts.write_inventory):
+        parser.error('--preload requires templates (-t) or '
+                     '--write-inventory.')
+    writes_files = not (opts.archive or opts.write_inventory)
+    if not opts.destdir and writes_files:
         parser.error('An output directory is required.')
-    if opts.header is None:
+    if opts.header is None and rootpath is not None:
         opts.header = path.abspath(rootpath).split(path.sep)[-1]
     if opts.suffix.startswith('.'):
         opts.suffix = opts.suffix[1:]
-    if not path.isdir(rootpath):
+    if rootpath is not None and not path.isdir(rootpath):
         print('%s is not a directory.' % rootpath, file=sys.stderr)
         sys.exit(1)
-    if not path.isdir(opts.destdir):
+    if not path.isdir(opts.destdir) and writes_files:
         if not opts.dryrun:
             os.makedirs(opts.destdir)
-    rootpath = path.abspath(rootpath)
-    excludes = normalize_excludes(rootpath, excludes)
+    if rootpath is not None:
+        rootpath = path.abspath(rootpath)
+        excludes = normalize_excludes(rootpath, excludes)
+    _PAGE_CACHE.resize(opts.cache_size)
+    opts.templates_stamp = None
+    if opts.cache_size > 0 and opts.templates:
+        opts.templates_stamp = _templates_stamp(opts.templates)
+    for module in opts.preload:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            _warn('failed to preload %r: %s' % (module, e))
+    opts.pool = None
+    if opts.preload and not opts.from_inventory and hasattr(os, 'fork'):
+        opts.pool = IntrospectionPool(
+            opts.preload_workers or os.cpu_count() or 1, opts)
+    opts.writer = None
+    if opts.write_inventory and not opts.dryrun:
+        opts.writer = InventoryWriter(
+            opts.write_inventory, destdir=opts.destdir, suffix=opts.suffix)
+    elif opts.archive and not opts.dryrun:
+        opts.writer = ArchiveWriter(opts.archive, destdir=opts.destdir)
+    elif opts.write_workers > 0 and not opts.dryrun:
+        opts.writer = PageWriter(opts.write_workers)
     try:
-        modules = recurse_tree(rootpath, excludes, opts)
-    except TemplateNotFound as e:
-        print('Cannot find template in %s: %s' %
-              (opts.templates, e), file=sys.stderr)
-        sys.exit(1)
-
-    if opts.full:
-        raise NotImplementedError("--full not supported")
-        # This would only make sense if this script was integrated in Sphinx
-        from sphinx import quickstart as qs
-        modules.sort()
-        prev_module = ''  # type: unicode
-        text = ''
-        for module in modules:
-            if module.startswith(prev_module + '.'):
-                continue
-            prev_module = module
-            text += '   %s\n' % module
-        d = dict(
-            path = opts.destdir,
-            sep = False,
-            dot = '_',
-            project = opts.header,
-            author = opts.author or 'Author',
-            version = opts.version or '',
-            release = opts.release or opts.version or '',
-            suffix = '.' + opts.suffix,
-            master = 'index',
-            epub = True,
-            ext_autodoc = True,
-            ext_viewcode = True,
-            ext_todo = True,
-            makefile = True,
-            batchfile = True,
-            mastertocmaxdepth = opts.maxdepth,
-            mastertoctree = text,
-            language = 'en',
-            module_path = rootpath,
-            append_syspath = opts.append_syspath,
-        )
-        enabled_exts = {'ext_' + ext: getattr(opts, 'ext_' + ext)
-                        for ext in EXTENSIONS if getattr(opts, 'ext_' + ext)}
-        d.update(enabled_exts)
-
-        if isinstance(opts.header, binary_type):
-            d['project'] = d['project'].decode('utf-8')
-        if isinstance(opts.author, binary_type):
-            d['author'] = d['author'].decode('utf-8')
-        if isinstance(opts.version, binary_type):
-            d['version'] = d['version'].decode('utf-8')
-        if isinstance(opts.release, binary_type):
-            d['release'] = d['release'].decode('utf-8')
-
-        if not opts.dryrun:
-            qs.generate(d, silent=True, overwrite=opts.force)
-    elif not opts.notoc:
-        create_modules_toc_file(modules, opts)
+        try:
+            if opts.from_inventory:
+                render_inventory(opts.from_inventory, opts)
+                return 0
+            elif opts.only:
+                modules = regenerate_modules(
+                    rootpath, excludes, opts, opts.only)
+            else:
+                modules = recurse_tree(rootpath, excludes, opts)
+            if opts.pool is not None:
+                opts.pool.close()
+        except TemplateNotFound as e:
+            print('Cannot find template in %s: %s' %
+                  (opts.templates, e), file=sys.stderr)
+            sys.exit(1)
+
+        if opts.full:
+            raise NotImplementedError("--full not supported")
+            # This would only make sense if this script was integrated in Sphinx
+            from sphinx import quickstart as qs
+            modules.sort()
+            prev_module = ''  # type: unicode
+            text = ''
+            for module in modules:
+                if module.startswith(prev_module + '.'):
+                    continue
+                prev_module = module
+                text += '   %s\n' % module
+            d = dict(
+                path = opts.destdir,
+                sep = False,
+                dot = '_',
+                project = opts.header,
+                author = opts.author or 'Author',
+                version = opts.version or '',
+                release = opts.release or opts.version or '',
+                suffix = '.' + opts.suffix,
+                master = 'index',
+                epub = True,
+                ext_autodoc = True,
+                ext_viewcode = True,
+                ext_todo = True,
+                makefile = True,
+                batchfile = True,
+                mastertocmaxdepth = opts.maxdepth,
+                mastertoctree = text,
+                language = 'en',
+                module_path = rootpath,
+                append_syspath = opts.append_syspath,
+            )
+            enabled_exts = {'ext_' + ext: getattr(opts, 'ext_' + ext)
+                            for ext in EXTENSIONS if getattr(opts, 'ext_' + ext)}
+            d.update(enabled_exts)
+
+            if isinstance(opts.header, binary_type):
+                d['project'] = d['project'].decode('utf-8')
+            if isinstance(opts.author, binary_type):
+                d['author'] = d['author'].decode('utf-8')
+            if isinstance(opts.version, binary_type):
+                d['version'] = d['version'].decode('utf-8')
+            if isinstance(opts.release, binary_type):
+                d['release'] = d['release'].decode('utf-8')
+
+            if not opts.dryrun:
+                qs.generate(d, silent=True, overwrite=opts.force)
+        elif opts.only and not opts.notoc:
+            patch_modules_toc_file(modules, opts)
+        elif not opts.notoc:
+            create_modules_toc_file(modules, opts)
+    finally:
+        if opts.pool is not None:
+            opts.pool.terminate()
+        if opts.writer is not None:
+            opts.writer.close()
     return 0
 
 
@@ -0,0 +1,18 @@
+import pytest
+
+import better_apidoc
+
+
+@pytest.fixture
+def sphinx_app(tmp_path, monkeypatch):
+    """Set `better_apidoc.APP` to a minimal Sphinx application"""
+    from sphinx.application import Sphinx
+    confdir = tmp_path / 'sphinx'
+    confdir.mkdir()
+    (confdir / 'conf.py').write_text("extensions = ['sphinx.ext.autodoc']\n")
+    app = Sphinx(
+        str(confdir), str(confdir), str(confdir / '_build'),
+        str(confdir / '_build' / 'doctrees'), 'html', status=None,
+        warning=None)
+    monkeypatch.setattr(better_apidoc, 'APP', app)
+    return app
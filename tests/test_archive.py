@@ -0,0 +1,77 @@
+"""Tests for writing all pages into a single archive (--archive)"""
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from better_apidoc import (
+    ARCHIVE_INDEX, ARCHIVE_INDEX_VERSION, ArchiveReader, ArchiveWriter,
+    extract_archive)
+
+
+PAGES = {
+    'pkg.rst': 'pkg package\n===========\n',
+    'pkg.mod_a.rst': 'pkg.mod_a module – ünicode\n',
+    'sub/modules.rst': 'pkg\n===\n',
+}
+
+
+@pytest.mark.parametrize('archive_name', ['api.zip', 'api.tar.gz'])
+def test_archive_round_trip(tmp_path, archive_name):
+    filename = str(tmp_path / archive_name)
+    destdir = str(tmp_path / 'api')
+    writer = ArchiveWriter(filename, destdir=destdir)
+    for (name, text) in PAGES.items():
+        fname = str(tmp_path / 'api' / name)
+        assert not writer.exists(fname)
+        writer.submit(fname, text)
+        assert writer.exists(fname)
+    writer.close()
+    with ArchiveReader(filename) as reader:
+        assert reader.pages == list(PAGES)
+        for (name, text) in PAGES.items():
+            assert reader.read(name) == text
+    out = tmp_path / 'out'
+    assert extract_archive(filename, str(out)) == list(PAGES)
+    for (name, text) in PAGES.items():
+        assert (out / name).read_text(encoding='utf-8') == text
+
+
+def write_crafted_zip(filename, pages):
+    """Write a zip archive with the given `pages` in its index"""
+    with zipfile.ZipFile(filename, 'w') as zip_fh:
+        for name in pages:
+            zip_fh.writestr(name, 'text')
+        zip_fh.writestr(ARCHIVE_INDEX, json.dumps(
+            {'version': ARCHIVE_INDEX_VERSION, 'pages': pages}))
+
+
+def write_crafted_tar(filename, pages):
+    """Write a gzipped tar archive with the given `pages` in its index"""
+    with tarfile.open(filename, 'w:gz') as tar_fh:
+        members = [(name, b'text') for name in pages]
+        members.append((ARCHIVE_INDEX, json.dumps(
+            {'version': ARCHIVE_INDEX_VERSION,
+             'pages': pages}).encode('utf-8')))
+        for (name, data) in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar_fh.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize('bad_name', [
+    '../evil.rst', 'sub/../../evil.rst', 'sub\\..\\..\\evil.rst',
+    '/tmp/evil.rst'])
+@pytest.mark.parametrize('archive_name, write_crafted', [
+    ('api.zip', write_crafted_zip), ('api.tar.gz', write_crafted_tar)])
+def test_extract_rejects_unsafe_names(tmp_path, bad_name, archive_name,
+                                      write_crafted):
+    filename = str(tmp_path / archive_name)
+    write_crafted(filename, ['ok.rst', bad_name])
+    out = tmp_path / 'nested' / 'out'
+    with pytest.raises(ValueError, match='unsafe page name'):
+        extract_archive(filename, str(out))
+    assert not (tmp_path / 'nested').exists()
+    assert not (tmp_path / 'evil.rst').exists()
@@ -0,0 +1,153 @@
+"""Tests for rendering pages from an inventory (--write-inventory and
+--from-inventory)"""
+import sys
+from textwrap import dedent
+
+import pytest
+
+import better_apidoc
+
+
+PACKAGE_FILES = {
+    '__init__.py': '''\
+        """The package. Long description."""
+        from .mod_a import func_a, ClassA
+
+        __all__ = ['func_a', 'ClassA', 'VALUE']
+
+        VALUE = 1
+
+        _refs = {'VALUE': ':data:`VALUE <invpkg.VALUE>`'}
+        ''',
+    'mod_a.py': '''\
+        """Module A."""
+        import os
+        from os.path import join
+
+        CONST = 3
+
+
+        def func_a(x):
+            """Do something. More details."""
+            return x
+
+
+        def _private():
+            """Private function"""
+
+
+        class ClassA(object):
+            """A class."""
+
+
+        class ErrA(ValueError):
+            """An exception."""
+        ''',
+    'sub/__init__.py': '''\
+        """Subpackage."""
+        from .mod_b import *
+        from .mod_b import __all__
+
+        _refs = {}
+        ''',
+    'sub/mod_b.py': '''\
+        """Module B."""
+        __all__ = ['func_b']
+
+
+        def func_b():
+            """Do b."""
+        ''',
+}
+
+MODULE_TEMPLATE = '''\
+{{ fullname }} {{ name }}: {{ doc }}
+{{ functions }} {{ classes }} {{ exceptions }} {{ data }} {{ members }}
+{{ get_members(typ='function', out_format='fullnames') }}
+{{ get_members(typ='class', out_format='refs') }}
+{{ get_members(typ='data', include_imported=True) }}
+{{ get_members(includeprivate=True) }}
+{{ get_members(out_format='table')|join('\n') }}
+'''
+
+PACKAGE_TEMPLATE = '''\
+{{ fullname }}: {{ doc }} {{ subpackages }} {{ submodules }}
+{{ get_members(in_list='__all__', include_imported=True, out_format='refs') }}
+{{ get_members(in_list='__all__', include_imported=True, out_format='refs',
+               known_refs='_refs') }}
+{{ get_members(in_list='__all__', include_imported=True, out_format='refs',
+               known_refs={'VALUE': 'the value'}) }}
+{% for m in submodules %}{{ m }}: {{ get_members(fullname=fullname ~ '.' ~ m,
+                                                 out_format='table') }}
+{% endfor %}
+'''
+
+
+@pytest.fixture
+def invpkg(tmp_path, monkeypatch):
+    """Return the root of the package 'invpkg' and a template directory"""
+    root = tmp_path / 'src' / 'invpkg'
+    (root / 'sub').mkdir(parents=True)
+    for (name, text) in PACKAGE_FILES.items():
+        (root / name).write_text(dedent(text))
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'module.rst').write_text(MODULE_TEMPLATE)
+    (templates / 'package.rst').write_text(PACKAGE_TEMPLATE)
+    monkeypatch.syspath_prepend(str(tmp_path / 'src'))
+    yield root, templates
+    for modname in list(sys.modules):
+        if modname.split('.')[0] == 'invpkg':
+            del sys.modules[modname]
+            better_apidoc._MODULE_STAMPS.pop(modname, None)
+
+
+def read_pages(folder):
+    return {f.name: f.read_text() for f in folder.iterdir()}
+
+
+@pytest.mark.parametrize('options', [[], ['-e'], ['-e', '-P']])
+@pytest.mark.parametrize('inventory_name', ['inv.json', 'inv.json.gz'])
+def test_inventory_round_trip(sphinx_app, invpkg, tmp_path, capsys, options,
+                              inventory_name):
+    """Rendering from an inventory gives the same pages as rendering the
+    templates directly"""
+    root, templates = invpkg
+    inventory = str(tmp_path / inventory_name)
+    direct = tmp_path / 'direct'
+    rendered = tmp_path / 'rendered'
+    assert better_apidoc.main(
+        ['better-apidoc', '-t', str(templates), '-f', '-o', str(direct)] +
+        options + [str(root)]) == 0
+    assert better_apidoc.main(
+        ['better-apidoc', '--write-inventory', inventory, '-f',
+         '-o', str(tmp_path / 'unused')] + options + [str(root)]) == 0
+    assert not (tmp_path / 'unused').exists()
+    for modname in list(sys.modules):
+        if modname.split('.')[0] == 'invpkg':
+            del sys.modules[modname]
+    assert better_apidoc.main(
+        ['better-apidoc', '--from-inventory', inventory,
+         '-t', str(templates), '-f', '-o', str(rendered)] + options) == 0
+    assert 'invpkg' not in sys.modules
+    assert 'WARNING' not in capsys.readouterr().err
+    direct_pages = read_pages(direct)
+    assert len(direct_pages) == (5 if '-e' in options else 3)
+    assert read_pages(rendered) == direct_pages
+
+
+def test_inventory_missing_module(sphinx_app, invpkg, tmp_path, capsys):
+    """Calling ``get_members`` for a module that is not in the inventory
+    gives a clear warning"""
+    root, templates = invpkg
+    (templates / 'module.rst').write_text(
+        "{{ get_members(fullname='os.path') }}")
+    inventory = str(tmp_path / 'inv.json')
+    assert better_apidoc.main(
+        ['better-apidoc', '--write-inventory', inventory, '-f', '-e',
+         '-o', str(tmp_path / 'unused'), str(root)]) == 0
+    assert better_apidoc.main(
+        ['better-apidoc', '--from-inventory', inventory,
+         '-t', str(templates), '-f', '-o', str(tmp_path / 'rendered')]) == 0
+    err = capsys.readouterr().err
+    assert "'os.path' is not in the inventory" in err
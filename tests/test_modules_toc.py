@@ -0,0 +1,40 @@
+"""Tests for updating the module index with --only"""
+from types import SimpleNamespace
+
+import pytest
+
+from better_apidoc import patch_modules_toc_file
+
+
+@pytest.fixture
+def opts(tmp_path):
+    return SimpleNamespace(
+        destdir=str(tmp_path), suffix='rst', dryrun=False, force=True)
+
+
+def test_patch_keeps_heading_and_options(opts, tmp_path):
+    index = tmp_path / 'modules.rst'
+    index.write_text(
+        'My Project\n==========\n\n.. toctree::\n   :maxdepth: 2\n\n'
+        '   zzz\n\nExtra text.\n')
+    patch_modules_toc_file(['pkg'], opts)
+    assert index.read_text() == (
+        'My Project\n==========\n\n.. toctree::\n   :maxdepth: 2\n\n'
+        '   pkg\n   zzz\n\nExtra text.\n')
+
+
+def test_patch_empty_toctree(opts, tmp_path):
+    index = tmp_path / 'modules.rst'
+    index.write_text('Title\n=====\n\n.. toctree::\n   :maxdepth: 3')
+    patch_modules_toc_file(['pkg'], opts)
+    assert index.read_text() == (
+        'Title\n=====\n\n.. toctree::\n   :maxdepth: 3\n\n   pkg\n')
+
+
+@pytest.mark.parametrize('text', ['', 'Title\n=====\n\nSome text.\n'])
+def test_patch_without_toctree(opts, tmp_path, capsys, text):
+    index = tmp_path / 'modules.rst'
+    index.write_text(text)
+    patch_modules_toc_file(['pkg'], opts)
+    assert index.read_text() == text
+    assert 'has no toctree' in capsys.readouterr().err
@@ -0,0 +1,62 @@
+"""Tests for calling main() repeatedly in the same process"""
+import sys
+from textwrap import dedent
+
+import pytest
+
+import better_apidoc
+
+
+MODULE_TEMPLATE = '{{ fullname }}: {{ functions }}\n'
+PACKAGE_TEMPLATE = '{{ fullname }}: {{ submodules }}\n'
+
+
+@pytest.fixture
+def stale_tree(tmp_path, monkeypatch):
+    """Return the root of a package 'stalepkg' with six pages, and the
+    template directory for it"""
+    root = tmp_path / 'src' / 'stalepkg'
+    (root / 'sub').mkdir(parents=True)
+    files = {
+        '__init__.py': '"""Package"""\n',
+        'a.py': 'def a():\n    pass\n',
+        'b.py': 'def b():\n    pass\n',
+        'sub/__init__.py': '"""Subpackage"""\n',
+        'sub/sm.py': 'def g():\n    pass\n',
+        'sub/c.py': 'def c():\n    pass\n',
+    }
+    for (name, text) in files.items():
+        (root / name).write_text(text)
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'module.rst').write_text(MODULE_TEMPLATE)
+    (templates / 'package.rst').write_text(PACKAGE_TEMPLATE)
+    monkeypatch.syspath_prepend(str(tmp_path / 'src'))
+    yield root, templates
+    for modname in list(sys.modules):
+        if modname.split('.')[0] == 'stalepkg':
+            del sys.modules[modname]
+            better_apidoc._MODULE_STAMPS.pop(modname, None)
+
+
+@pytest.mark.parametrize('cache_size', [0, 2, 100])
+def test_changed_module_is_reloaded(sphinx_app, stale_tree, tmp_path,
+                                    cache_size):
+    """A module that changes between calls of main() is reloaded, whether
+    or not its page is still in the page cache"""
+    root, templates = stale_tree
+    out = tmp_path / 'out'
+    argv = ['better-apidoc', '-t', str(templates), '-e', '-f',
+            '--cache-size', str(cache_size), '-o', str(out), str(root)]
+    page = out / 'stalepkg.sub.sm.rst'
+    assert better_apidoc.main(argv) == 0
+    assert len(list(out.iterdir())) == 7
+    assert better_apidoc.main(argv) == 0
+    assert page.read_text() == "stalepkg.sub.sm: ['g']"
+    with (root / 'sub' / 'sm.py').open('a') as out_fh:
+        out_fh.write(dedent('''
+            def h():
+                pass
+            '''))
+    assert better_apidoc.main(argv) == 0
+    assert page.read_text() == "stalepkg.sub.sm: ['g', 'h']"
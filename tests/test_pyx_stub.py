@@ -0,0 +1,142 @@
+"""Tests for introspecting Cython modules without importing them"""
+import inspect
+import sys
+from textwrap import dedent
+
+import pytest
+
+import better_apidoc
+from better_apidoc import _pyx_to_stub, _import_module, _get_mod_ns
+
+
+PYX_SOURCE = dedent('''\
+    # cython: language_level=3
+    """Fast module. Compiled."""
+    cimport numpy as cnp
+    from libc.math cimport sqrt
+    from .mod_a import func_a
+
+    __all__ = ['one_liner', 'norm', 'Vec', 'VecError', 'SCALE']
+
+    DEF N = 3
+    cdef int _counter = 0
+    SCALE = 2.0
+
+    def one_liner(x): return x
+    cpdef double norm(double[:] x,
+                      int n=3) except? -1:
+        """Compute the norm. Really."""
+        cdef int i
+        return 0
+
+    cdef double _private(double y):
+        """Not visible from Python"""
+        return y
+
+    cdef class Vec:
+        """A vector."""
+        cdef double x
+
+    class VecError(ValueError): pass
+    ''')
+
+
+@pytest.fixture
+def pyx_module(tmp_path):
+    pkg = tmp_path / 'pkg'
+    pkg.mkdir()
+    (pkg / '__init__.py').write_text('')
+    pyx_file = pkg / 'cy.pyx'
+    pyx_file.write_text(PYX_SOURCE, encoding='utf-8')
+    return str(pyx_file)
+
+
+def test_pyx_to_stub_module_docstring():
+    stub = _pyx_to_stub(PYX_SOURCE)
+    assert stub.startswith('"""Fast module. Compiled."""\n')
+
+
+def test_pyx_to_stub_one_liner_def():
+    stub = _pyx_to_stub(PYX_SOURCE)
+    assert 'def one_liner(*args, **kwargs):\n    ...\n' in stub
+    assert 'def norm(*args, **kwargs):\n' in stub
+    assert 'class VecError(ValueError):\n    ...\n' in stub
+
+
+def test_pyx_to_stub_one_liner_def_at_end():
+    stub = _pyx_to_stub('def f(x): return x\n')
+    assert stub == 'def f(*args, **kwargs):\n    ...\n'
+
+
+def test_pyx_to_stub_no_module_docstring():
+    stub = _pyx_to_stub('X = 1\n"""not a docstring"""\n')
+    assert stub == 'X = ...\n'
+
+
+def test_pyx_to_stub_skips_c_declarations():
+    stub = _pyx_to_stub(PYX_SOURCE)
+    assert '_private' not in stub
+    assert '_counter' not in stub
+    assert 'cimport' not in stub
+    assert 'N = ' not in stub
+
+
+def test_import_pyx_module(pyx_module):
+    mod = _import_module('pkg.cy', source=pyx_module)
+    assert mod.__doc__ == "Fast module. Compiled."
+    assert mod.__all__ == ['one_liner', 'norm', 'Vec', 'VecError', 'SCALE']
+    assert inspect.isfunction(mod.one_liner)
+    assert mod.norm.__doc__ == "Compute the norm. Really."
+    assert mod.Vec.__doc__ == "A vector."
+    assert issubclass(mod.VecError, ValueError)
+    assert mod.func_a.__module__ == 'pkg.mod_a'
+    assert not hasattr(mod, '_private')
+
+
+def test_import_pyx_module_prefers_stub(pyx_module):
+    stub_file = pyx_module[:-len('.pyx')] + '.pyi'
+    with open(stub_file, 'w', encoding='utf-8') as out_fh:
+        out_fh.write('"""Stub doc – unicode."""\ndef f(x: int) -> int: ...\n')
+    mod = _import_module('pkg.cy', source=pyx_module)
+    assert mod.__doc__ == "Stub doc – unicode."
+    assert inspect.isfunction(mod.f)
+    assert not hasattr(mod, 'norm')
+
+
+def test_get_mod_ns_pyx(pyx_module, sphinx_app):
+    ns = _get_mod_ns(
+        name='cy', fullname='pkg.cy', includeprivate=False,
+        source=pyx_module)
+    assert ns['doc'] == "Fast module. Compiled."
+    assert ns['functions'] == ['norm', 'one_liner']
+    assert ns['classes'] == ['Vec']
+    assert ns['exceptions'] == ['VecError']
+    assert ns['data'] == ['SCALE']
+
+
+def test_get_members_pyx_submodule(tmp_path, monkeypatch, sphinx_app,
+                                   capsys):
+    """A package template can call ``get_members`` for a Cython submodule
+    that is not compiled"""
+    pkg = tmp_path / 'src' / 'cpkg'
+    pkg.mkdir(parents=True)
+    (pkg / '__init__.py').write_text('"""Package"""\n')
+    (pkg / 'fast.pyx').write_text(dedent('''\
+        """Fast module."""
+        cpdef double norm(double x):
+            """Compute the norm."""
+            return x
+        '''))
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'package.rst').write_text(
+        "{{ get_members(fullname=fullname ~ '.fast') }}")
+    monkeypatch.syspath_prepend(str(tmp_path / 'src'))
+    monkeypatch.delitem(sys.modules, 'cpkg', raising=False)
+    out = tmp_path / 'out'
+    assert better_apidoc.main([
+        'better-apidoc', '-t', str(templates), '-f', '-o', str(out),
+        str(pkg)]) == 0
+    assert (out / 'cpkg.rst').read_text() == "['norm']"
+    assert 'failed to import' not in capsys.readouterr().err
+    sys.modules.pop('cpkg', None)